@@ -0,0 +1,7 @@
+"""Gunicorn配置：多进程部署，替代Flask自带的单进程开发服务器"""
+import multiprocessing
+
+bind = "0.0.0.0:5000"
+# CPU密集型端点（/api/simulate-load）依赖多进程并行，使用默认的sync worker
+workers = multiprocessing.cpu_count() * 2 + 1
+keepalive = 30
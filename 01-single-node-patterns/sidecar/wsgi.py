@@ -0,0 +1,14 @@
+"""Gunicorn入口：从main-app.py加载Flask应用（文件名含连字符，无法直接import）"""
+import importlib.util
+import os
+import sys
+
+_spec = importlib.util.spec_from_file_location(
+    "main_app", os.path.join(os.path.dirname(__file__), "main-app.py")
+)
+_module = importlib.util.module_from_spec(_spec)
+# 先注册到sys.modules：进程池pickle模块内函数时要按模块名重新导入
+sys.modules[_spec.name] = _module
+_spec.loader.exec_module(_module)
+
+app = _module.app
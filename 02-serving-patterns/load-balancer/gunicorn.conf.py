@@ -0,0 +1,8 @@
+"""Gunicorn配置：多进程部署，替代Flask自带的单进程开发服务器"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+# CPU密集型端点（/api/load-test）依赖多进程并行，使用默认的sync worker
+workers = multiprocessing.cpu_count() * 2 + 1
+keepalive = 30
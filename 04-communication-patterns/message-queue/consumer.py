@@ -1,7 +1,11 @@
+import os
 import redis
-import json
+import orjson
 import time
 import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 import signal
 import sys
@@ -13,12 +17,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 与生产者共用的计数hash，字段形如 "order_queue:processed"
+COUNTER_HASH_KEY = 'queue_counters'
+
+# 生产端msgspec信封（array_like）的字段顺序，用于把JSON数组还原成dict
+_ENVELOPE_FIELDS = ('id', 'timestamp', 'data', 'priority', 'retry_count')
+
+# 与生产者保持一致：USE_REDIS_STREAMS=1时改为消费Redis Stream（消费组+XACK）
+USE_STREAMS = os.environ.get('USE_REDIS_STREAMS', '0') == '1'
+STREAM_GROUP = 'consumers'
+
 class MessageConsumer:
     """消息消费者"""
     
-    def __init__(self, redis_host='redis', redis_port=6379):
+    def __init__(self, redis_host='redis', redis_port=6379, max_workers=8):
         self.redis = redis.Redis(host=redis_host, port=redis_port, decode_responses=True)
         self.running = True
+        # 批内消息并发处理：处理逻辑以I/O等待为主，
+        # 多线程可以让这些等待互相重叠
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="consumer")
+        self.use_blmpop = True  # Redis 7+ 支持批量取出，不支持时自动降级
+        # 每批次内累积处理计数，批末一次性用pipeline刷出，
+        # 避免每条消息一次INCR往返
+        self._pending_incrs = Counter()
+        self._incr_lock = threading.Lock()
         self.processors = {
             'order_queue': self.process_order,
             'user_queue': self.process_user_registration,
@@ -26,6 +48,9 @@ class MessageConsumer:
             'notification_queue': self.process_notification
         }
         
+        # 预先拼好各队列在计数hash里的字段名，刷计数时不再做f-string拼接
+        self._processed_fields = {q: f"{q}:processed" for q in self.processors}
+
         # 注册信号处理器以优雅关闭
         signal.signal(signal.SIGINT, self.signal_handler)
         signal.signal(signal.SIGTERM, self.signal_handler)
@@ -35,22 +60,103 @@ class MessageConsumer:
         logger.info(f"Received signal {signum}, shutting down gracefully...")
         self.running = False
     
-    def consume_messages(self, queue_names, block_timeout=1):
+    def consume_streams(self, queue_names, block_timeout=1, batch_size=32):
+        """以消费组方式消费Redis Stream，处理成功后XACK确认"""
+        logger.info(f"Starting stream consumer for streams: {queue_names}")
+
+        consumer_name = f"consumer-{os.getpid()}"
+        for queue_name in queue_names:
+            try:
+                self.redis.xgroup_create(queue_name, STREAM_GROUP, id='0', mkstream=True)
+            except redis.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise  # 消费组已存在是正常情况，其余错误照常抛出
+
+        # 启动延迟队列搬运线程
+        promoter = threading.Thread(
+            target=self.promote_delayed_messages, args=(queue_names,), daemon=True
+        )
+        promoter.start()
+
+        streams = {queue_name: '>' for queue_name in queue_names}
+
+        while self.running:
+            try:
+                response = self.redis.xreadgroup(
+                    STREAM_GROUP, consumer_name, streams,
+                    count=batch_size, block=int(block_timeout * 1000)
+                )
+                if not response:
+                    continue
+
+                for stream_name, entries in response:
+                    futures = [
+                        self.executor.submit(self._process_stream_entry,
+                                             stream_name, entry_id, fields)
+                        for entry_id, fields in entries
+                    ]
+                    wait(futures)
+                    self._flush_processed_counts()
+
+            except redis.ConnectionError as e:
+                logger.error(f"Redis connection error: {e}")
+                time.sleep(5)  # 等待重连
+            except Exception as e:
+                logger.error(f"Unexpected error in stream consumer loop: {e}")
+                time.sleep(1)
+
+        self.executor.shutdown(wait=True)
+        self._flush_processed_counts()
+        logger.info("Stream consumer shutting down")
+
+    def _process_stream_entry(self, stream_name, entry_id, fields):
+        """处理单条Stream记录并确认"""
+        self.process_message(stream_name, fields.get('message', '{}'))
+        self.redis.xack(stream_name, STREAM_GROUP, entry_id)
+
+    def consume_messages(self, queue_names, block_timeout=1, batch_size=32):
         """从多个队列消费消息"""
         logger.info(f"Starting message consumer for queues: {queue_names}")
-        
+
+        # 启动延迟队列搬运线程，把到期的重试消息搬回工作队列
+        promoter = threading.Thread(
+            target=self.promote_delayed_messages, args=(queue_names,), daemon=True
+        )
+        promoter.start()
+
         while self.running:
             try:
-                # 使用BLPOP从多个队列中阻塞式获取消息
-                result = self.redis.blpop(queue_names, timeout=block_timeout)
-                
-                if result:
-                    queue_name, message_json = result
-                    self.process_message(queue_name, message_json)
+                # 使用BLMPOP一次从队列中批量取出多条消息（Redis 7+），
+                # 把多次网络往返摊薄到一个批次上
+                if self.use_blmpop:
+                    try:
+                        result = self.redis.blmpop(
+                            block_timeout, len(queue_names), *queue_names,
+                            direction="LEFT", count=batch_size
+                        )
+                    except redis.ResponseError:
+                        # Redis < 7 不支持BLMPOP，回退到逐条BLPOP
+                        logger.warning("BLMPOP not supported, falling back to BLPOP")
+                        self.use_blmpop = False
+                        continue
+
+                    if result:
+                        queue_name, messages = result
+                        # 并发处理整批消息，等全部完成后统一刷计数
+                        futures = [
+                            self.executor.submit(self.process_message, queue_name, message_json)
+                            for message_json in messages
+                        ]
+                        wait(futures)
+                        self._flush_processed_counts()
                 else:
-                    # 超时，继续循环检查running状态
-                    continue
-                    
+                    result = self.redis.blpop(queue_names, timeout=block_timeout)
+
+                    if result:
+                        queue_name, message_json = result
+                        self.process_message(queue_name, message_json)
+                        self._flush_processed_counts()
+
             except redis.ConnectionError as e:
                 logger.error(f"Redis connection error: {e}")
                 time.sleep(5)  # 等待重连
@@ -58,23 +164,30 @@ class MessageConsumer:
                 logger.error(f"Unexpected error in consumer loop: {e}")
                 time.sleep(1)
         
+        self.executor.shutdown(wait=True)
+        self._flush_processed_counts()
         logger.info("Consumer shutting down")
     
     def process_message(self, queue_name, message_json):
         """处理单个消息"""
         try:
-            message = json.loads(message_json)
+            message = orjson.loads(message_json)
+            if isinstance(message, list):
+                # 生产端的msgspec信封是定长JSON数组，按字段顺序还原成dict
+                message = dict(zip(_ENVELOPE_FIELDS, message))
             message_id = message.get('id', 'unknown')
             
             logger.info(f"Processing message {message_id} from queue {queue_name}")
             
-            # 根据队列类型处理消息
-            if queue_name in self.processors:
-                success = self.processors[queue_name](message)
+            # 根据队列类型处理消息：get一次完成存在性检查和取值
+            processor = self.processors.get(queue_name)
+            if processor is not None:
+                success = processor(message)
                 
                 if success:
-                    # 增加处理计数
-                    self.redis.incr(f"{queue_name}:processed_count")
+                    # 累积处理计数，批末统一刷出
+                    with self._incr_lock:
+                        self._pending_incrs[queue_name] += 1
                     logger.info(f"Successfully processed message {message_id}")
                 else:
                     # 处理失败，重新入队或进入死信队列
@@ -82,7 +195,7 @@ class MessageConsumer:
             else:
                 logger.warning(f"No processor found for queue {queue_name}")
                 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Invalid JSON message: {e}")
         except Exception as e:
             logger.error(f"Error processing message: {e}")
@@ -93,25 +206,68 @@ class MessageConsumer:
         max_retries = 3
         
         if retry_count < max_retries:
-            # 增加重试计数并重新入队
+            # 增加重试计数，按指数退避排期到延迟队列，
+            # 不在消费线程上sleep，避免阻塞其他队列的消费
             message['retry_count'] = retry_count + 1
             message['last_retry'] = datetime.now().isoformat()
-            
-            # 延迟重试（简单的指数退避）
+
             delay = 2 ** retry_count
-            time.sleep(delay)
-            
-            self.redis.rpush(queue_name, json.dumps(message))
-            logger.info(f"Message {message.get('id')} requeued for retry {retry_count + 1}")
+            self._schedule_retry(queue_name, message, delay)
+            logger.info(f"Message {message.get('id')} scheduled for retry {retry_count + 1} in {delay}s")
         else:
             # 超过最大重试次数，放入死信队列
             dead_letter_queue = f"{queue_name}:dead_letter"
             message['failed_at'] = datetime.now().isoformat()
             message['failure_reason'] = 'max_retries_exceeded'
             
-            self.redis.rpush(dead_letter_queue, json.dumps(message))
+            self.redis.rpush(dead_letter_queue, orjson.dumps(message))
             logger.error(f"Message {message.get('id')} moved to dead letter queue after {max_retries} retries")
     
+    def _flush_processed_counts(self):
+        """把本批次累积的处理计数一次性刷到Redis"""
+        with self._incr_lock:
+            if not self._pending_incrs:
+                return
+            pending = dict(self._pending_incrs)
+            self._pending_incrs.clear()
+
+        pipe = self.redis.pipeline(transaction=False)
+        for queue_name, count in pending.items():
+            field = self._processed_fields.get(queue_name) or f"{queue_name}:processed"
+            pipe.hincrby(COUNTER_HASH_KEY, field, count)
+        pipe.execute()
+
+    def _schedule_retry(self, queue_name, message, delay):
+        """把消息放入延迟队列（有序集合，score为到期时间）"""
+        self.redis.zadd(f"{queue_name}:delayed", {orjson.dumps(message): time.time() + delay})
+
+    def promote_delayed_messages(self, queue_names, interval=0.2, batch_size=100):
+        """后台线程：把到期的延迟消息搬回对应的工作队列"""
+        delayed_keys = [(q, f"{q}:delayed") for q in queue_names]
+
+        while self.running:
+            try:
+                now = time.time()
+                for queue_name, delayed_key in delayed_keys:
+                    due = self.redis.zrangebyscore(delayed_key, 0, now, start=0, num=batch_size)
+                    if due:
+                        # 一次往返完成移除和重新入队
+                        pipe = self.redis.pipeline(transaction=False)
+                        pipe.zrem(delayed_key, *due)
+                        if USE_STREAMS:
+                            for message_json in due:
+                                pipe.xadd(queue_name, {'message': message_json})
+                        else:
+                            pipe.rpush(queue_name, *due)
+                        pipe.execute()
+            except redis.ConnectionError as e:
+                logger.error(f"Redis connection error in delay promoter: {e}")
+                time.sleep(5)
+            except Exception as e:
+                logger.error(f"Unexpected error in delay promoter: {e}")
+
+            time.sleep(interval)
+
     def process_order(self, message):
         """处理订单消息"""
         try:
@@ -131,7 +287,7 @@ class MessageConsumer:
             
             for step in steps:
                 logger.info(f"Order {order_id}: {step}")
-                time.sleep(0.5)  # 模拟处理时间
+            time.sleep(2.5)  # 一次性模拟全部步骤的处理时间
             
             # 模拟5%的失败率
             import random
@@ -164,7 +320,7 @@ class MessageConsumer:
             
             for step in steps:
                 logger.info(f"User {user_id}: {step}")
-                time.sleep(0.3)  # 模拟处理时间
+            time.sleep(1.5)  # 一次性模拟全部步骤的处理时间
             
             logger.info(f"User {user_id} registration processed successfully")
             return True
@@ -227,7 +383,10 @@ def main():
     
     # 开始消费消息
     try:
-        consumer.consume_messages(queues)
+        if USE_STREAMS:
+            consumer.consume_streams(queues)
+        else:
+            consumer.consume_messages(queues)
     except KeyboardInterrupt:
         logger.info("Consumer interrupted by user")
     except Exception as e:
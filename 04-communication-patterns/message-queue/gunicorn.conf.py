@@ -0,0 +1,6 @@
+"""Gunicorn配置：gevent worker在等待Redis往返时切换处理其他请求"""
+bind = "0.0.0.0:8001"
+workers = 4
+worker_class = "gevent"
+worker_connections = 500
+keepalive = 30
@@ -1,18 +1,150 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+import atexit
+import os
+import queue
+import random
 import redis
-import json
+import time
+import orjson
+import threading
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Any
 import logging
 
+import msgspec
+from logging.handlers import QueueHandler, QueueListener
+
 app = Flask(__name__)
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
+
+class _SampleInfoFilter(logging.Filter):
+    """按1/N的比例采样INFO日志，更高级别全部放行"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        return random.randrange(self.rate) == 0
+
+
+# 配置日志：请求线程只把日志记录投递到队列，由后台监听线程统一输出，
+# 日志I/O不再阻塞发送路径；REQ_LOG_SAMPLE=N时INFO按1/N采样
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(
+    _log_queue, logging.StreamHandler(), respect_handler_level=True
+)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+_log_handler = QueueHandler(_log_queue)
+_sample_rate = int(os.environ.get('REQ_LOG_SAMPLE', 0))
+if _sample_rate > 1:
+    _log_handler.addFilter(_SampleInfoFilter(_sample_rate))
+
+logging.basicConfig(level=logging.INFO, handlers=[_log_handler])
 logger = logging.getLogger(__name__)
 
-# 连接Redis
-redis_client = redis.Redis(host='redis', port=6379, decode_responses=True)
+# hiredis提供C实现的RESP协议解析器，安装后redis-py自动启用，
+# pipeline大批量回复的解析开销明显下降；缺失时仅提醒，不影响功能
+try:
+    import hiredis  # noqa: F401
+except ImportError:
+    logger.warning("hiredis not installed, using the pure-Python Redis reply parser")
+
+# 连接Redis：与Redis同节点部署（共享volume挂载socket）时，
+# 设置REDIS_UNIX_SOCKET走UNIX域套接字，完全绕开TCP协议栈，
+# 这里大量小命令的单次往返延迟能降一半以上；
+# 否则用显式限定大小的阻塞TCP连接池，复用连接、不会无限制新建socket
+_unix_socket_path = os.environ.get('REDIS_UNIX_SOCKET')
+if _unix_socket_path:
+    REDIS_POOL = redis.ConnectionPool(
+        connection_class=redis.UnixDomainSocketConnection,
+        path=_unix_socket_path,
+        max_connections=int(os.environ.get('REDIS_POOL_SIZE', 64)),
+        decode_responses=True
+    )
+else:
+    REDIS_POOL = redis.BlockingConnectionPool(
+        host='redis',
+        port=6379,
+        max_connections=int(os.environ.get('REDIS_POOL_SIZE', 64)),
+        timeout=5,
+        decode_responses=True,
+        socket_keepalive=True,
+        health_check_interval=30
+    )
+redis_client = redis.Redis(connection_pool=REDIS_POOL)
+
+# /health专用的小连接池：200ms socket超时让探测在Redis卡顿时快速失败，
+# 且独立于主连接池，探活永远抢不走业务路径的最后一个连接
+if _unix_socket_path:
+    _HEALTH_POOL = redis.ConnectionPool(
+        connection_class=redis.UnixDomainSocketConnection,
+        path=_unix_socket_path,
+        max_connections=2,
+        decode_responses=True,
+        socket_timeout=0.2
+    )
+else:
+    _HEALTH_POOL = redis.ConnectionPool(
+        host='redis',
+        port=6379,
+        max_connections=2,
+        decode_responses=True,
+        socket_timeout=0.2
+    )
+health_redis = redis.Redis(connection_pool=_HEALTH_POOL)
+
+# 各类请求体的必填字段，issubset一次完成校验
+_ORDER_REQUIRED = frozenset(('user_id', 'product', 'amount'))
+_USER_REQUIRED = frozenset(('username', 'email'))
+
+def _parse_json_body():
+    """用orjson直接解析请求体，跳过get_json的Content-Type检查和stdlib解析"""
+    body = request.get_data(cache=False)
+    if not body:
+        return None
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def _new_id():
+    """生成消息ID：hex形式跳过UUID字符串里连字符的格式化"""
+    return uuid.uuid4().hex
+
+def _now_iso():
+    """当前UTC时间戳，毫秒精度，格式化开销低于默认的微秒isoformat"""
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+
+# 所有队列的发送/处理计数集中放在一个hash里，
+# 字段形如 "order_queue:sent" / "order_queue:processed"，
+# 一条HGETALL即可取回全部计数
+COUNTER_HASH_KEY = 'queue_counters'
+
+# 可选的Redis Stream传输：XADD入队并用MAXLEN近似裁剪防止无界增长，
+# 消费端配合消费组+XACK。设置USE_REDIS_STREAMS=1时生产/消费两端一起切换，
+# 默认保持列表队列
+USE_STREAMS = os.environ.get('USE_REDIS_STREAMS', '0') == '1'
+STREAM_MAXLEN = int(os.environ.get('STREAM_MAXLEN', 100000))
+
+class Message(msgspec.Struct, array_like=True):
+    """消息信封：固定字段的Struct，编码为JSON数组，
+    省掉每条消息重复的键名，编码/解码都比dict快
+    """
+    id: str
+    timestamp: str
+    data: Any
+    priority: int = 0
+    retry_count: int = 0
+
+# 模块级复用同一个编码器实例
+_ENCODER = msgspec.json.Encoder()
 
 # 队列名称定义
 QUEUES = {
@@ -22,103 +154,299 @@ QUEUES = {
     'notifications': 'notification_queue'
 }
 
+# 每个已知队列对应的(Lua KEYS列表, sent字段, processed字段)，
+# 导入时一次算好，发送和状态读取路径不再逐次拼f-string
+_KEY_CACHE = {
+    q: ([q, COUNTER_HASH_KEY], f"{q}:sent", f"{q}:processed")
+    for q in QUEUES.values()
+}
+
+# 校验用的frozenset：成员判断O(1)，不再每次请求重建dict视图
+_VALID_QUEUES = frozenset(QUEUES.values())
+_VALID_QUEUE_TYPES = frozenset(QUEUES)
+
+# 订单金额超过该阈值时追加高优先级通知
+HIGH_VALUE_THRESHOLD = 1000
+
+def _queue_keys(queue_name):
+    """取队列的预生成键组；未知队列动态回退（路由校验后不应出现）"""
+    keys = _KEY_CACHE.get(queue_name)
+    if keys is None:
+        keys = ([queue_name, COUNTER_HASH_KEY],
+                f"{queue_name}:sent", f"{queue_name}:processed")
+    return keys
+
 class MessageProducer:
     """消息生产者"""
-    
+
+    # 入队+计数的Lua脚本：注册一次后走EVALSHA，
+    # 单次往返内原子完成PUSH和hash计数
+    _PUSH_SCRIPT = """
+redis.call('{cmd}', KEYS[1], ARGV[1])
+redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+return 1
+"""
+
     def __init__(self, redis_client):
         self.redis = redis_client
+        self._push_high = redis_client.register_script(self._PUSH_SCRIPT.format(cmd='LPUSH'))
+        self._push_normal = redis_client.register_script(self._PUSH_SCRIPT.format(cmd='RPUSH'))
+
+        # 发送路径改为进程内有界队列 + 后台pipeline刷写线程：
+        # HTTP请求把消息放进outbox即可返回，Redis往返被整批摊薄。
+        # 语义为最多一次——进程崩溃时尚未刷出的消息会丢失
+        self._outbox = queue.Queue(maxsize=10000)
+        self._flusher_thread = threading.Thread(target=self._flusher, daemon=True)
+        self._flusher_thread.start()
+        atexit.register(self._drain_outbox)
         
-    def send_message(self, queue_name, message_data, priority=0):
+    @staticmethod
+    def _build_message(message_data, priority, message_id=None, timestamp=None):
+        """组装消息信封；调用方已有的ID/时间戳直接复用，不再重复生成"""
+        return Message(
+            id=message_id or _new_id(),
+            timestamp=timestamp or _now_iso(),
+            data=message_data,
+            priority=priority
+        )
+
+    def send_message(self, queue_name, message_data, priority=0,
+                     message_id=None, timestamp=None):
         """发送消息到队列"""
-        message = {
-            'id': str(uuid.uuid4()),
-            'timestamp': datetime.now().isoformat(),
-            'data': message_data,
-            'priority': priority,
-            'retry_count': 0
-        }
-        
-        message_json = json.dumps(message)
-        
-        # 使用Redis列表作为队列
-        if priority > 0:
-            # 高优先级消息放到队列前面
-            self.redis.lpush(queue_name, message_json)
-        else:
-            # 普通消息放到队列后面
-            self.redis.rpush(queue_name, message_json)
-            
-        # 记录消息发送指标
-        self.redis.incr(f"{queue_name}:sent_count")
-        
-        logger.info(f"Message sent to {queue_name}: {message['id']}")
-        return message['id']
+        message = self._build_message(message_data, priority, message_id, timestamp)
+
+        message_json = _ENCODER.encode(message)
+        self._enqueue(queue_name, message_json, priority)
+
+        logger.info("Message sent to %s: %s", queue_name, message.id)
+        return message.id
+
+    def send_message_sync(self, queue_name, message_data, priority=0,
+                          message_id=None, timestamp=None):
+        """同步发送：绕过outbox直接写Redis，供测试或需要确认落队的场景"""
+        message = self._build_message(message_data, priority, message_id, timestamp)
+        self._send_sync(queue_name, _ENCODER.encode(message), priority)
+        return message.id
+
+    def _enqueue(self, queue_name, message_json, priority):
+        """把消息投入outbox；满时退化为同步发送，形成天然背压"""
+        try:
+            self._outbox.put_nowait((queue_name, message_json, priority))
+        except queue.Full:
+            self._send_sync(queue_name, message_json, priority)
+
+    def _send_sync(self, queue_name, message_json, priority):
+        script_keys, sent_field, _ = _queue_keys(queue_name)
+
+        if USE_STREAMS:
+            # Stream模式：XADD入队（MAXLEN裁剪），计数仍走同一个hash
+            with self.redis.pipeline(transaction=False) as pipe:
+                pipe.xadd(queue_name, {'message': message_json, 'priority': priority},
+                          maxlen=STREAM_MAXLEN, approximate=True)
+                pipe.hincrby(COUNTER_HASH_KEY, sent_field, 1)
+                pipe.execute()
+            return
+
+        # 高优先级消息放到队列前面，普通消息放到队列后面；
+        # 入队和计数由Lua脚本一次往返原子完成
+        script = self._push_high if priority > 0 else self._push_normal
+        script(keys=script_keys, args=[message_json, sent_field])
+
+    def _flusher(self, max_batch=256):
+        """后台线程：整批取出outbox里的消息，用一个pipeline刷入Redis"""
+        while True:
+            batch = [self._outbox.get()]
+            try:
+                while len(batch) < max_batch:
+                    batch.append(self._outbox.get_nowait())
+            except queue.Empty:
+                pass
+
+            try:
+                self._flush_batch(batch)
+            except Exception as e:
+                logger.error("Failed to flush %d messages to Redis: %s", len(batch), e)
+
+    def _flush_batch(self, batch):
+        if USE_STREAMS:
+            # Stream没有变长XADD，逐条进pipeline，计数按队列合并
+            counts = {}
+            with self.redis.pipeline(transaction=False) as pipe:
+                for queue_name, message_json, priority in batch:
+                    pipe.xadd(queue_name, {'message': message_json, 'priority': priority},
+                              maxlen=STREAM_MAXLEN, approximate=True)
+                    counts[queue_name] = counts.get(queue_name, 0) + 1
+                for queue_name, count in counts.items():
+                    pipe.hincrby(COUNTER_HASH_KEY, _queue_keys(queue_name)[1], count)
+                pipe.execute()
+            return
+
+        # 同队列同优先级的消息归为一组：一条变长PUSH命令完成整组入队，
+        # 计数合并为一条INCRBY
+        groups = {}
+        for queue_name, message_json, priority in batch:
+            groups.setdefault((queue_name, priority > 0), []).append(message_json)
+
+        with self.redis.pipeline(transaction=False) as pipe:
+            for (queue_name, high_priority), message_jsons in groups.items():
+                if high_priority:
+                    pipe.lpush(queue_name, *message_jsons)
+                else:
+                    pipe.rpush(queue_name, *message_jsons)
+                pipe.hincrby(COUNTER_HASH_KEY, _queue_keys(queue_name)[1], len(message_jsons))
+            pipe.execute()
+
+    def _drain_outbox(self):
+        """进程退出前尽力把outbox里剩余的消息刷出去"""
+        batch = []
+        try:
+            while True:
+                batch.append(self._outbox.get_nowait())
+        except queue.Empty:
+            pass
+
+        if batch:
+            try:
+                self._flush_batch(batch)
+            except Exception as e:
+                logger.error("Failed to drain %d messages on shutdown: %s", len(batch), e)
     
+    def send_messages_batch(self, items):
+        """批量发送消息：同一HTTP请求产生的多条消息一起进入outbox
+
+        items为(queue_name, message_data, priority[, message_id, timestamp])
+        元组列表，返回与之一一对应的消息ID列表。
+        """
+        prepared = []
+        for queue_name, message_data, priority, *extra in items:
+            message = self._build_message(message_data, priority, *extra)
+            prepared.append((queue_name, _ENCODER.encode(message), priority, message.id))
+
+        for queue_name, message_json, priority, _ in prepared:
+            self._enqueue(queue_name, message_json, priority)
+
+        for queue_name, _, _, message_id in prepared:
+            logger.info("Message sent to %s: %s", queue_name, message_id)
+
+        return [entry[3] for entry in prepared]
+
     def get_queue_status(self, queue_name):
         """获取队列状态"""
-        length = self.redis.llen(queue_name)
-        sent_count = self.redis.get(f"{queue_name}:sent_count") or 0
-        processed_count = self.redis.get(f"{queue_name}:processed_count") or 0
-        
-        return {
-            'queue_name': queue_name,
-            'length': length,
-            'sent_count': int(sent_count),
-            'processed_count': int(processed_count),
-            'pending_count': length
-        }
+        return self.get_queues_status([queue_name])[queue_name]
+
+    def get_queues_status(self, queue_names):
+        """批量获取队列状态：N个LLEN加一条HGETALL，一次pipeline往返"""
+        with self.redis.pipeline(transaction=False) as pipe:
+            for queue_name in queue_names:
+                if USE_STREAMS:
+                    pipe.xlen(queue_name)
+                else:
+                    pipe.llen(queue_name)
+            pipe.hgetall(COUNTER_HASH_KEY)
+            results = pipe.execute()
+
+        counters = results[-1]
+        status = {}
+        for queue_name, length in zip(queue_names, results):
+            _, sent_field, processed_field = _queue_keys(queue_name)
+            status[queue_name] = {
+                'queue_name': queue_name,
+                'length': length,
+                'sent_count': int(counters.get(sent_field, 0)),
+                'processed_count': int(counters.get(processed_field, 0)),
+                'pending_count': length
+            }
+        return status
 
 # 初始化消息生产者
 producer = MessageProducer(redis_client)
 
+# 启动时用HSETNX把所有已知队列的计数字段补齐为0：
+# 一次pipeline往返完成，之后HGETALL总能取到完整字段，
+# 状态读取不再需要缺省值分支
+try:
+    with redis_client.pipeline(transaction=False) as _pipe:
+        for _, _sent_field, _processed_field in _KEY_CACHE.values():
+            _pipe.hsetnx(COUNTER_HASH_KEY, _sent_field, 0)
+            _pipe.hsetnx(COUNTER_HASH_KEY, _processed_field, 0)
+        _pipe.execute()
+except redis.RedisError as e:
+    logger.warning("Could not initialize queue counters: %s", e)
+
+# /metrics各行的标签前缀在导入时编码成字节，抓取时只追加数值
+_METRIC_TEMPLATES = [
+    (queue_name,
+     f'queue_length{{queue="{name}"}} '.encode(),
+     f'queue_sent_total{{queue="{name}"}} '.encode(),
+     f'queue_processed_total{{queue="{name}"}} '.encode())
+    for name, queue_name in QUEUES.items()
+]
+
+# 探测结果缓存1秒：编排器每1-2秒打一次/health，
+# TTL内直接复用上次结果，不再对Redis逐次PING
+_HEALTH_TTL = 1.0
+_last_ping = {'t': 0.0, 'ok': True, 'error': None}
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """健康检查"""
-    try:
-        redis_client.ping()
+    now = time.monotonic()
+    if now - _last_ping['t'] >= _HEALTH_TTL:
+        try:
+            health_redis.ping()
+            _last_ping['ok'] = True
+            _last_ping['error'] = None
+        except Exception as e:
+            _last_ping['ok'] = False
+            _last_ping['error'] = str(e)
+        _last_ping['t'] = now
+
+    if _last_ping['ok']:
         return jsonify({
             'status': 'healthy',
             'service': 'message-producer',
             'redis_connection': 'ok',
-            'timestamp': datetime.now().isoformat()
+            'timestamp': _now_iso()
         })
-    except Exception as e:
-        return jsonify({
-            'status': 'unhealthy',
-            'error': str(e),
-            'timestamp': datetime.now().isoformat()
-        }), 503
+    return jsonify({
+        'status': 'unhealthy',
+        'error': _last_ping['error'],
+        'timestamp': _now_iso()
+    }), 503
 
 @app.route('/api/orders', methods=['POST'])
 def create_order():
     """创建订单并发送到队列"""
     try:
-        order_data = request.get_json()
+        order_data = _parse_json_body()
         
         if not order_data:
             return jsonify({'error': 'Invalid JSON data'}), 400
             
         # 验证必需字段
-        required_fields = ['user_id', 'product', 'amount']
-        if not all(field in order_data for field in required_fields):
+        if not _ORDER_REQUIRED.issubset(order_data):
             return jsonify({'error': 'Missing required fields'}), 400
         
         # 添加订单ID和时间戳
-        order_data['order_id'] = str(uuid.uuid4())
-        order_data['created_at'] = datetime.now().isoformat()
-        
-        # 发送到订单处理队列
-        message_id = producer.send_message(QUEUES['orders'], order_data)
+        order_data['order_id'] = _new_id()
+        order_data['created_at'] = _now_iso()
         
+        # 订单消息和可能的高优先级通知合并为一个批次发送
+        # 复用路由里已生成的订单ID和时间戳，不再让信封重复生成
+        items = [(QUEUES['orders'], order_data, 0,
+                  order_data['order_id'], order_data['created_at'])]
+
         # 如果金额大于1000，设为高优先级
-        if order_data['amount'] > 1000:
+        if order_data['amount'] > HIGH_VALUE_THRESHOLD:
             # 发送高优先级通知
             notification_data = {
                 'type': 'high_value_order',
                 'order_id': order_data['order_id'],
                 'amount': order_data['amount']
             }
-            producer.send_message(QUEUES['notifications'], notification_data, priority=1)
+            items.append((QUEUES['notifications'], notification_data, 1))
+
+        message_id = producer.send_messages_batch(items)[0]
         
         return jsonify({
             'message': 'Order created successfully',
@@ -128,38 +456,81 @@ def create_order():
         }), 201
         
     except Exception as e:
-        logger.error(f"Error creating order: {e}")
+        logger.error("Error creating order: %s", e)
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/orders/batch', methods=['POST'])
+def create_orders_batch():
+    """批量创建订单：整批订单走一次批量发送"""
+    try:
+        data = _parse_json_body()
+
+        if not data or not isinstance(data.get('orders'), list) or not data['orders']:
+            return jsonify({'error': 'Non-empty orders list is required'}), 400
+
+        items = []
+        order_ids = []
+
+        for order_data in data['orders']:
+            if not isinstance(order_data, dict) or not _ORDER_REQUIRED.issubset(order_data):
+                return jsonify({'error': 'Missing required fields in one of the orders'}), 400
+
+            order_data['order_id'] = _new_id()
+            order_data['created_at'] = _now_iso()
+            items.append((QUEUES['orders'], order_data, 0,
+                          order_data['order_id'], order_data['created_at']))
+            order_ids.append(order_data['order_id'])
+
+            # 如果金额大于1000，设为高优先级
+            if order_data['amount'] > HIGH_VALUE_THRESHOLD:
+                items.append((QUEUES['notifications'], {
+                    'type': 'high_value_order',
+                    'order_id': order_data['order_id'],
+                    'amount': order_data['amount']
+                }, 1))
+
+        producer.send_messages_batch(items)
+
+        return jsonify({
+            'message': 'Orders created successfully',
+            'order_ids': order_ids,
+            'count': len(order_ids),
+            'status': 'queued'
+        }), 201
+
+    except Exception as e:
+        logger.error("Error creating orders batch: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/users', methods=['POST'])
 def register_user():
     """用户注册并发送欢迎消息"""
     try:
-        user_data = request.get_json()
+        user_data = _parse_json_body()
         
         if not user_data:
             return jsonify({'error': 'Invalid JSON data'}), 400
             
         # 验证必需字段
-        required_fields = ['username', 'email']
-        if not all(field in user_data for field in required_fields):
+        if not _USER_REQUIRED.issubset(user_data):
             return jsonify({'error': 'Missing required fields'}), 400
         
         # 添加用户ID和注册时间
-        user_data['user_id'] = str(uuid.uuid4())
-        user_data['registered_at'] = datetime.now().isoformat()
-        
-        # 发送到用户处理队列
-        message_id = producer.send_message(QUEUES['users'], user_data)
+        user_data['user_id'] = _new_id()
+        user_data['registered_at'] = _now_iso()
         
-        # 发送欢迎邮件消息
+        # 用户消息和欢迎邮件合并为一个批次发送
         email_data = {
             'to': user_data['email'],
             'template': 'welcome',
             'user_id': user_data['user_id'],
             'username': user_data['username']
         }
-        email_message_id = producer.send_message(QUEUES['emails'], email_data)
+        # 复用路由里已生成的用户ID和注册时间，不再让信封重复生成
+        message_id, email_message_id = producer.send_messages_batch([
+            (QUEUES['users'], user_data, 0, user_data['user_id'], user_data['registered_at']),
+            (QUEUES['emails'], email_data, 0)
+        ])
         
         return jsonify({
             'message': 'User registered successfully',
@@ -170,14 +541,14 @@ def register_user():
         }), 201
         
     except Exception as e:
-        logger.error(f"Error registering user: {e}")
+        logger.error("Error registering user: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/messages', methods=['POST'])
 def send_custom_message():
     """发送自定义消息"""
     try:
-        data = request.get_json()
+        data = _parse_json_body()
         
         if not data:
             return jsonify({'error': 'Invalid JSON data'}), 400
@@ -189,7 +560,7 @@ def send_custom_message():
         if not queue_name or not message_data:
             return jsonify({'error': 'Queue name and data are required'}), 400
         
-        if queue_name not in QUEUES.values():
+        if queue_name not in _VALID_QUEUES:
             return jsonify({'error': f'Invalid queue name. Valid queues: {list(QUEUES.values())}'}), 400
         
         message_id = producer.send_message(queue_name, message_data, priority)
@@ -202,60 +573,91 @@ def send_custom_message():
         }), 201
         
     except Exception as e:
-        logger.error(f"Error sending custom message: {e}")
+        logger.error("Error sending custom message: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/queue/status', methods=['GET'])
 def get_all_queue_status():
     """获取所有队列状态"""
     try:
-        status = {}
-        for name, queue_name in QUEUES.items():
-            status[name] = producer.get_queue_status(queue_name)
+        # 四个队列的状态在一次往返内取回
+        statuses = producer.get_queues_status(list(QUEUES.values()))
+        status = {name: statuses[queue_name] for name, queue_name in QUEUES.items()}
         
-        return jsonify({
+        # 嵌套较深的状态结构用orjson直接编码，绕开jsonify
+        return Response(orjson.dumps({
             'queues': status,
-            'timestamp': datetime.now().isoformat()
-        })
+            'timestamp': _now_iso()
+        }), mimetype='application/json')
         
     except Exception as e:
-        logger.error(f"Error getting queue status: {e}")
+        logger.error("Error getting queue status: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/queue/<queue_type>/status', methods=['GET'])
 def get_queue_status(queue_type):
     """获取指定队列状态"""
     try:
-        if queue_type not in QUEUES:
+        if queue_type not in _VALID_QUEUE_TYPES:
             return jsonify({'error': f'Invalid queue type. Valid types: {list(QUEUES.keys())}'}), 400
         
         queue_name = QUEUES[queue_type]
         status = producer.get_queue_status(queue_name)
         
-        return jsonify(status)
+        return Response(orjson.dumps(status), mimetype='application/json')
         
     except Exception as e:
-        logger.error(f"Error getting queue status: {e}")
+        logger.error("Error getting queue status: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
+def _render_metrics():
+    """渲染Prometheus指标体：一次pipeline往返取回所有队列的数值，
+    标签前缀已预编码，这里只追加数值"""
+    statuses = producer.get_queues_status(list(QUEUES.values()))
+
+    parts = []
+    for queue_name, length_t, sent_t, processed_t in _METRIC_TEMPLATES:
+        status = statuses[queue_name]
+        parts.append(length_t + str(status["length"]).encode())
+        parts.append(sent_t + str(status["sent_count"]).encode())
+        parts.append(processed_t + str(status["processed_count"]).encode())
+
+    return b'\n'.join(parts)
+
+class _MetricsCache:
+    """/metrics响应体缓存：TTL内直接返回已渲染的字节，
+    过期后用非阻塞锁保证同一时刻只有一个请求去查Redis刷新，
+    其余请求拿到上一次的结果，抓取频率与Redis负载解耦"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.body = b''
+        self.expires = 0.0
+        self._refresh_lock = threading.Lock()
+
+    def get(self):
+        if time.monotonic() < self.expires:
+            return self.body
+        if self._refresh_lock.acquire(blocking=False):
+            try:
+                self.body = _render_metrics()
+                self.expires = time.monotonic() + self.ttl
+            finally:
+                self._refresh_lock.release()
+        return self.body
+
+_metrics_cache = _MetricsCache(float(os.environ.get('METRICS_TTL', 1.0)))
+
 @app.route('/metrics', methods=['GET'])
 def metrics():
     """Prometheus格式的指标"""
     try:
-        metrics_data = []
-        
-        for name, queue_name in QUEUES.items():
-            status = producer.get_queue_status(queue_name)
-            metrics_data.append(f'queue_length{{queue="{name}"}} {status["length"]}')
-            metrics_data.append(f'queue_sent_total{{queue="{name}"}} {status["sent_count"]}')
-            metrics_data.append(f'queue_processed_total{{queue="{name}"}} {status["processed_count"]}')
-        
-        return '\n'.join(metrics_data), 200, {'Content-Type': 'text/plain'}
-        
+        return Response(_metrics_cache.get(), mimetype='text/plain')
     except Exception as e:
-        logger.error(f"Error getting metrics: {e}")
+        logger.error("Error getting metrics: %s", e)
         return "# Error getting metrics\n", 500, {'Content-Type': 'text/plain'}
 
 if __name__ == '__main__':
+    # 仅用于本地调试，生产环境用 gunicorn -c gunicorn.conf.py wsgi:app 启动
     logger.info("Starting Message Producer API")
     app.run(host='0.0.0.0', port=8001, debug=False)
@@ -0,0 +1,5 @@
+"""Gunicorn入口：gevent monkey-patch必须在导入任何网络库之前执行"""
+from gevent import monkey
+monkey.patch_all()
+
+from producer import app  # noqa: E402,F401